@@ -0,0 +1,91 @@
+"""Checkpoints to resume long replays"""
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import time
+from pathlib import Path
+
+from datacat.config import Configuration
+from datacat.source import SourcePosition
+
+
+def build(conf: Configuration) -> Checkpointer | None:
+    """Build the `Checkpointer` for the given configuration, if any"""
+
+    if conf.checkpoint is None:
+        return None
+    return Checkpointer(
+        conf.checkpoint.path,
+        every_rows=conf.checkpoint.every_rows,
+        every_s=conf.checkpoint.every_s,
+    )
+
+
+@dataclasses.dataclass
+class Checkpoint:
+    """The state needed to resume a replay after `rows` rows have been produced"""
+
+    rows: int
+    position: SourcePosition
+    # See `ConductorIterator.anchor`
+    anchor: str | None = None
+
+    def save(self, path: Path):
+        """Atomically write the checkpoint to `path`"""
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with tmp_path.open("w") as f:
+            json.dump(dataclasses.asdict(self), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Checkpoint:
+        with path.open("r") as f:
+            data = json.load(f)
+        return cls(
+            rows=data["rows"],
+            position=SourcePosition(**data["position"]),
+            anchor=data["anchor"],
+        )
+
+
+class Checkpointer:
+    """An object that periodically saves `Checkpoint`s.
+
+    The rows may still be buffered or batched in the sinks when they are produced,
+    so each checkpoint is kept pending and only saved once every sink has acknowledged
+    all its rows
+    """
+
+    def __init__(self, path: Path, every_rows: int, every_s: float):
+        self.path = path
+        self.every_rows = every_rows
+        self.every_s = every_s
+        self._pending: list[Checkpoint] = []
+        self._next_rows = every_rows
+        self._next_time = time.monotonic() + every_s
+
+    def load(self) -> Checkpoint | None:
+        """Load the last saved checkpoint, if there is one"""
+        if not self.path.exists():
+            return None
+        return Checkpoint.load(self.path)
+
+    def due(self, rows: int) -> bool:
+        """Whether a new checkpoint should be taken after `rows` rows"""
+        return rows >= self._next_rows or time.monotonic() >= self._next_time
+
+    def add(self, checkpoint: Checkpoint):
+        """Take a new checkpoint, to be saved once its rows have been acknowledged"""
+        self._pending.append(checkpoint)
+        self._next_rows = checkpoint.rows + self.every_rows
+        self._next_time = time.monotonic() + self.every_s
+
+    def commit(self, acked_rows: int):
+        """Save the latest pending checkpoint with at most `acked_rows` rows"""
+        ready = None
+        while self._pending and self._pending[0].rows <= acked_rows:
+            ready = self._pending.pop(0)
+        if ready is not None:
+            ready.save(self.path)
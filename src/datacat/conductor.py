@@ -9,7 +9,7 @@ import datetime
 import time
 
 from datacat.config import Configuration
-from datacat.typing import AsyncData, LazyData
+from datacat.typing import LazyData, Row
 
 # TODO(alvaro): Add different conductors
 #   - Burst / Batches
@@ -34,10 +34,31 @@ class Conductor(abc.ABC):
     """
 
     @abc.abstractmethod
-    def conduct(self, data: LazyData) -> AsyncData:
+    def conduct(self, data: LazyData, anchor: str | None = None) -> ConductorIterator:
+        """Produce the rows of `data` with the right timing.
+
+        `anchor` is the `ConductorIterator.anchor` of a previous run, to resume its
+        timing from where it was left
+        """
         ...
 
 
+class ConductorIterator(abc.ABC):
+    """An AsyncIterator that produces the rows of a `Conductor`"""
+
+    def __aiter__(self):
+        return self
+
+    @abc.abstractmethod
+    async def __anext__(self) -> Row:
+        ...
+
+    @property
+    def anchor(self) -> str | None:
+        """The timing state needed to resume after the last row that was produced"""
+        return None
+
+
 class FixedRateConductor(Conductor):
     """Timing Generator that yields rows at a fixed rate (rows/s)"""
 
@@ -48,11 +69,11 @@ class FixedRateConductor(Conductor):
         self.row_period = 1 / rows_per_s
         self.verbose = verbose
 
-    def conduct(self, data: LazyData) -> AsyncData:
+    def conduct(self, data: LazyData, anchor: str | None = None) -> ConductorIterator:
         return FixedRateConductorIterator(data, self.row_period, verbose=self.verbose)
 
 
-class FixedRateConductorIterator:
+class FixedRateConductorIterator(ConductorIterator):
     """An AsyncIterator that produces the rows at a fixed rate"""
 
     def __init__(self, data: LazyData, row_period: float, verbose: bool = False):
@@ -60,9 +81,6 @@ class FixedRateConductorIterator:
         self.row_period = row_period
         self.verbose = verbose
 
-    def __aiter__(self):
-        return self
-
     async def __anext__(self):
         await asyncio.sleep(self.row_period)
         if self.verbose:
@@ -92,13 +110,17 @@ class OriginalRateConductor(Conductor):
         self.datetime_format = datetime_format
         self.verbose = verbose
 
-    def conduct(self, data: LazyData) -> AsyncData:
+    def conduct(self, data: LazyData, anchor: str | None = None) -> ConductorIterator:
         return OriginalRateConductorIterator(
-            data, self.timestamp_field, self.datetime_format, verbose=self.verbose
+            data,
+            self.timestamp_field,
+            self.datetime_format,
+            anchor=anchor,
+            verbose=self.verbose,
         )
 
 
-class OriginalRateConductorIterator:
+class OriginalRateConductorIterator(ConductorIterator):
     """An AsyncIterator that produces the rows maintaing the original time rate"""
 
     def __init__(
@@ -106,6 +128,7 @@ class OriginalRateConductorIterator:
         data: LazyData,
         timestamp_field: str,
         datetime_format: str | None,
+        anchor: str | None = None,
         verbose: bool = False,
     ):
         self._inner_iter = iter(data)
@@ -115,8 +138,17 @@ class OriginalRateConductorIterator:
         self.previous_timestamp = None
         self.previous_tick = None
 
-    def __aiter__(self):
-        return self
+        if anchor is not None:
+            # Resuming: the next row keeps its original delay from the last row of
+            # the previous run
+            self.previous_timestamp = datetime.datetime.fromisoformat(anchor)
+            self.previous_tick = time.monotonic_ns()
+
+    @property
+    def anchor(self) -> str | None:
+        if self.previous_timestamp is None:
+            return None
+        return self.previous_timestamp.isoformat()
 
     async def __anext__(self):
         # Pull the next value
@@ -4,10 +4,18 @@ from __future__ import annotations
 import argparse
 from collections import ChainMap
 from pathlib import Path
-from typing import Literal
+from typing import Annotated, Literal
 
 import yaml
-from pydantic import BaseModel, Field, FilePath, PositiveFloat
+from pydantic import (
+    BaseModel,
+    DirectoryPath,
+    Field,
+    FilePath,
+    NonNegativeFloat,
+    PositiveFloat,
+    PositiveInt,
+)
 
 
 class Configuration(BaseModel):
@@ -20,7 +28,9 @@ class Configuration(BaseModel):
     source: CsvSourceConfig | ParquetSourceConfig | NdJsonSourceConfig | JsonSourceConfig | GlobFileSourceConfig = Field(
         discriminator="type"
     )
-    sink: ConsoleSinkConfig | KafkaSinkConfig = Field(discriminator="type")
+    # NOTE(alvaro): Either a single sink or a list of sinks that all receive the same
+    # stream of rows (see `sinks`)
+    sink: SinkConfig | list[SinkConfig]
     format: JsonSerializerConfig = Field(discriminator="type")
     conductor: FixedRateConductorConfig | OriginalRateConductorConfig = Field(
         discriminator="type"
@@ -28,6 +38,13 @@ class Configuration(BaseModel):
     timestamp: NowTimestamperConfig | NoneTimestamperConfig = Field(
         discriminator="type"
     )
+    checkpoint: CheckpointConfig | None = None
+    profile: ProfileConfig | None = None
+
+    @property
+    def sinks(self) -> list[SinkConfig]:
+        """The configured sinks, always as a list"""
+        return self.sink if isinstance(self.sink, list) else [self.sink]
 
 
 class CsvSourceConfig(BaseModel):
@@ -56,16 +73,98 @@ class GlobFileSourceConfig(BaseModel):
     source_type: Literal["csv", "parquet", "json", "ndjson"]
 
 
-class ConsoleSinkConfig(BaseModel):
+class BufferConfig(BaseModel):
+    """Bounded buffer that decouples each sink from the rest of the pipeline.
+
+    The `policy` decides what happens when the buffer is full:
+        - `spill`: write the row to a temporary file in `spill_dir` and send it later.
+          Once the file reaches `spill_max_bytes`, wait for the sink like `block`
+        - `drop`: discard the row
+        - `block`: wait for the sink to catch up (this throttles every other sink)
+    """
+
+    size: PositiveInt = 1000
+    # NOTE(alvaro): Defaults to `spill` when there are several sinks, so that a slow
+    # sink does not slow down the rest of them without losing rows, and to `block`
+    # when there is only one (there is nothing else to slow down)
+    policy: Literal["block", "drop", "spill"] | None = None
+    spill_dir: DirectoryPath | None = None
+    spill_max_bytes: PositiveInt = 1024 * 1024 * 1024
+
+
+class BaseSinkConfig(BaseModel):
+    # Overrides the top level `format` for this sink
+    format: JsonSerializerConfig | None = None
+    buffer: BufferConfig = BufferConfig()
+
+
+class ConsoleSinkConfig(BaseSinkConfig):
     type: Literal["console"]
 
 
-class KafkaSinkConfig(BaseModel):
+class KafkaSinkConfig(BaseSinkConfig):
     type: Literal["kafka"]
     bootstrap_servers: str | list[str]
     topic: str
 
 
+class BatchConfig(BaseModel):
+    """Rows are sent in a single request once any of the limits is reached"""
+
+    max_rows: PositiveInt = 500
+    max_bytes: PositiveInt = 1024 * 1024
+    linger_ms: NonNegativeFloat = 50
+
+
+class RetryConfig(BaseModel):
+    """Exponential backoff for failed requests"""
+
+    max_attempts: PositiveInt = 5
+    backoff_ms: PositiveFloat = 100
+    max_backoff_ms: PositiveFloat = 10_000
+
+
+class NetworkSinkConfig(BaseSinkConfig):
+    batch: BatchConfig = BatchConfig()
+    retry: RetryConfig = RetryConfig()
+    max_in_flight: PositiveInt = 4
+
+
+class TcpSinkConfig(NetworkSinkConfig):
+    type: Literal["tcp"]
+    host: str
+    port: PositiveInt
+    # Defaults to `max_in_flight`
+    pool_size: PositiveInt | None = None
+
+
+class UdpSinkConfig(NetworkSinkConfig):
+    type: Literal["udp"]
+    host: str
+    port: PositiveInt
+
+
+class HttpSinkConfig(NetworkSinkConfig):
+    type: Literal["http"]
+    url: str
+    method: str = "POST"
+    headers: dict[str, str] = {}
+    content_type: str = "application/x-ndjson"
+    timeout_s: PositiveFloat = 30
+    # Defaults to `max_in_flight`
+    pool_size: PositiveInt | None = None
+
+
+SinkConfig = Annotated[
+    ConsoleSinkConfig
+    | KafkaSinkConfig
+    | TcpSinkConfig
+    | UdpSinkConfig
+    | HttpSinkConfig,
+    Field(discriminator="type"),
+]
+
+
 # TODO(alvaro): Should we rename this to ndjson for consistency?
 class JsonSerializerConfig(BaseModel):
     type: Literal["json"]
@@ -91,6 +190,32 @@ class NoneTimestamperConfig(BaseModel):
     type: Literal["none"]
 
 
+class CheckpointConfig(BaseModel):
+    """Periodically save the position of the replay so that it can be resumed"""
+
+    path: Path = Path("datacat.checkpoint.json")
+    every_rows: PositiveInt = 10_000
+    every_s: PositiveFloat = 10
+
+
+class ProfileConfig(BaseModel):
+    """Profile the generation to find out where the time goes"""
+
+    path: Path = Path("datacat.prof")
+    # Time each stage of the pipeline
+    timers: bool = True
+    # NOTE(alvaro): `cprofile` and `tracemalloc` are off by default, their overhead
+    # inflates the timers and the event loop stalls
+    cprofile: bool = False
+    tracemalloc: bool = False
+    # Window of the run (in seconds since the start) for `cprofile` and `tracemalloc`
+    start_s: NonNegativeFloat = 0
+    duration_s: PositiveFloat | None = None
+    # Number of functions and allocations in the report
+    top: PositiveInt = 20
+    stall_interval_ms: PositiveFloat = 10
+
+
 def compile(config_path: Path, args: argparse.Namespace) -> Configuration:
     """Load the configuration from the different sources and merge it.
 
@@ -106,6 +231,11 @@ def compile(config_path: Path, args: argparse.Namespace) -> Configuration:
     args_data = prepare_cli_args(args)
     file_data = prepare_config_file(config_path)
 
+    # The nested sections given in the CLI only override some of their fields
+    for key in ("checkpoint", "profile"):
+        if key in args_data and isinstance(file_data.get(key), dict):
+            args_data[key] = {**file_data[key], **args_data[key]}
+
     merged_data = ChainMap(args_data, file_data)
 
     return Configuration.model_validate(merged_data)
@@ -142,6 +272,17 @@ def prepare_cli_args(args: argparse.Namespace) -> dict:
             "path": str(args.path),
         }
 
+    if args.checkpoint is not None:
+        data["checkpoint"] = {"path": str(args.checkpoint)}
+    elif args.resume:
+        # Resuming needs a checkpoint, use the default one if there is none
+        data["checkpoint"] = {}
+
+    if args.profile_path is not None:
+        data["profile"] = {"path": str(args.profile_path)}
+    elif args.profile:
+        data["profile"] = {}
+
     return data
 
 
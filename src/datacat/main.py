@@ -3,9 +3,20 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import sys
 from pathlib import Path
 
-from datacat import conductor, config, helpers, serializer, sink, source, timestamper
+from datacat import (
+    checkpoint,
+    conductor,
+    config,
+    helpers,
+    profiler,
+    serializer,
+    sink,
+    source,
+    timestamper,
+)
 
 # TODO(alvaro): Make source and sink async so that everything can work asynchronously
 # TODO(alvaro): Add the concept of ticks so that we can give more precise timings
@@ -31,6 +42,28 @@ def main() -> int:
         default="datacat.yaml",
         help="Path to configuration file",
     )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=None,
+        help="Path to the checkpoint file (enables checkpointing)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume the replay from the last checkpoint",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the generation",
+    )
+    parser.add_argument(
+        "--profile-path",
+        type=Path,
+        default=None,
+        help="Path to write the profiling results to (implies --profile)",
+    )
 
     args = parser.parse_args()
     n = args.n
@@ -39,36 +72,118 @@ def main() -> int:
     conf = config.compile(args.config, args)
 
     # TODO(alvaro): Proper error handling
-    asyncio.run(generate_data(conf, n))
+    asyncio.run(generate_data(conf, n, resume=args.resume))
     return 0
 
 
-async def generate_data(conf: config.Configuration, n: int | None = None):
-    """Generate the data based on the given configuration"""
+async def generate_data(
+    conf: config.Configuration, n: int | None = None, resume: bool = False
+):
+    """Generate the data based on the given configuration.
+
+    If `resume` is set, the generation continues from the last checkpoint
+    """
 
     # Prepare the generator given the configuration
     gen_source = source.build(conf)
-    gen_serializer = serializer.build(conf)
+    gen_serializers = serializer.build_all(conf)
     gen_timestamper = timestamper.build(conf)
     gen_conductor = conductor.build(conf, verbose=VERBOSE)
-
+    gen_sinks = sink.build(conf)
+    gen_checkpointer = checkpoint.build(conf)
+    gen_profiler = profiler.build(conf)
+
+    # NOTE(alvaro): The components are only wrapped when profiling, so that there is
+    # no overhead otherwise
+    if gen_profiler is not None:
+        gen_timestamper = gen_profiler.wrap_timestamper(gen_timestamper)
+        outputs = list(
+            zip(
+                gen_profiler.wrap_serializers(gen_serializers),
+                gen_profiler.wrap_sinks(gen_sinks),
+            )
+        )
+    else:
+        outputs = list(zip(gen_serializers, gen_sinks))
+
+    start = None
+    if resume and gen_checkpointer is not None:
+        start = gen_checkpointer.load()
+        if start is None:
+            print("no checkpoint found, starting from the beginning", file=sys.stderr)
+    # Number of rows sent to every sink (including the ones of the resumed run)
+    resumed_rows = start.rows if start is not None else 0
+    rows = resumed_rows
+
+    ready_sinks = []
+    completed = False
     try:
-        gen_sink = sink.build(conf)
-        await gen_sink.init()
+        for gen_sink in gen_sinks:
+            await gen_sink.init()
+            ready_sinks.append(gen_sink)
+        if gen_profiler is not None:
+            gen_profiler.start()
 
         # Run the generation engine
-        data = gen_source.load()
-        stream = gen_conductor.conduct(data)
+        data = gen_source.stream(start.position if start is not None else None)
+        if gen_profiler is not None:
+            data = gen_profiler.wrap_data(data)
+        if start is not None:
+            conducted = gen_conductor.conduct(data, anchor=start.anchor)
+        else:
+            conducted = gen_conductor.conduct(data)
+        if gen_profiler is not None:
+            conducted = gen_profiler.wrap_conducted(conducted)
         # TODO(alvaro): Add support for batch output
-        stream = stream if n is None else helpers.aislice(stream, n)
+        stream = (
+            conducted if n is None else helpers.aislice(conducted, max(0, n - rows))
+        )
         async for row in stream:
             ts = gen_timestamper.timestamp()
             if ts is not None:
                 row[gen_timestamper.field_name] = ts.isoformat()
-            serialized = gen_serializer.serialize(row)
-            await gen_sink.output(serialized)
+
+            # Each row is serialized only once per serializer and fanned out to
+            # every sink
+            serialized: dict[int, str] = {}
+            for gen_serializer, gen_sink in outputs:
+                key = id(gen_serializer)
+                if key not in serialized:
+                    serialized[key] = gen_serializer.serialize(row)
+                await gen_sink.output(serialized[key])
+            rows += 1
+
+            if gen_checkpointer is not None and gen_checkpointer.due(rows):
+                gen_checkpointer.add(
+                    checkpoint.Checkpoint(rows, gen_source.position, conducted.anchor)
+                )
+                # Only the rows confirmed by every sink are safe to skip on resume
+                acked = min(gen_sink.acked for gen_sink in gen_sinks)
+                gen_checkpointer.commit(resumed_rows + acked)
+        completed = True
     finally:
-        await gen_sink.teardown()
+        try:
+            # Let every sink finish sending its buffered rows even if some of them fail
+            results = await asyncio.gather(
+                *(gen_sink.teardown() for gen_sink in ready_sinks),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+
+            # After the teardown every row has been sent, so the checkpoints are safe
+            if gen_checkpointer is not None and len(ready_sinks) == len(gen_sinks):
+                if completed:
+                    gen_checkpointer.add(
+                        checkpoint.Checkpoint(
+                            rows, gen_source.position, conducted.anchor
+                        )
+                    )
+                gen_checkpointer.commit(rows)
+        finally:
+            if gen_profiler is not None:
+                await gen_profiler.stop()
 
 
 if __name__ == "__main__":
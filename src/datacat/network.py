@@ -0,0 +1,180 @@
+"""Networking helpers for the network sinks"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import socket
+import ssl
+from typing import AsyncIterator
+
+
+class HttpError(RuntimeError):
+    """The server answered with an unsuccessful status code"""
+
+    def __init__(self, status: int, body: bytes):
+        super().__init__(f"HTTP {status}: {body[:200]!r}")
+        self.status = status
+        self.body = body
+
+
+class RetryableHttpError(HttpError):
+    """An `HttpError` that may succeed if the request is retried"""
+
+
+# Errors after which it makes sense to retry a request
+RETRYABLE_ERRORS = (OSError, EOFError, asyncio.TimeoutError, RetryableHttpError)
+
+
+class Connection:
+    """A TCP connection that can be reused"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        # Set to `False` if the connection should not go back to the pool
+        self.reusable = True
+
+    @property
+    def is_closed(self) -> bool:
+        return self.reader.at_eof() or self.writer.is_closing()
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool:
+    """A pool of keep-alive TCP connections (optionally using TLS) to a single host.
+
+    At most `size` connections are open at the same time, and idle connections are
+    reused by the next request
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        size: int,
+        *,
+        ssl_context: ssl.SSLContext | None = None,
+        connect_timeout: float = 10,
+    ):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.ssl_context = ssl_context
+        self.connect_timeout = connect_timeout
+        self._idle: list[Connection] = []
+        self._slots = asyncio.Semaphore(size)
+
+    @contextlib.asynccontextmanager
+    async def connection(self) -> AsyncIterator[Connection]:
+        """Borrow a connection from the pool.
+
+        If the block raises, the connection is discarded instead of being reused
+        """
+        async with self._slots:
+            conn = None
+            while self._idle and conn is None:
+                conn = self._idle.pop()
+                if conn.is_closed:
+                    conn.close()
+                    conn = None
+            if conn is None:
+                conn = await self._connect()
+
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+
+            if conn.reusable and not conn.is_closed:
+                self._idle.append(conn)
+            else:
+                conn.close()
+
+    async def close(self):
+        while self._idle:
+            conn = self._idle.pop()
+            conn.close()
+            with contextlib.suppress(OSError):
+                await conn.writer.wait_closed()
+
+    async def _connect(self) -> Connection:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl_context),
+            self.connect_timeout,
+        )
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return Connection(reader, writer)
+
+
+async def http_request(
+    conn: Connection,
+    method: str,
+    host: str,
+    path: str,
+    headers: dict[str, str],
+    body: bytes,
+) -> tuple[int, bytes]:
+    """Send a single HTTP/1.1 request over `conn` and read the response.
+
+    Returns the status code and the body of the response. `conn.reusable` is updated
+    depending on whether the server wants to keep the connection alive
+    """
+    lines = [
+        f"{method} {path} HTTP/1.1",
+        f"Host: {host}",
+        f"Content-Length: {len(body)}",
+        "Connection: keep-alive",
+    ]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+    conn.writer.write(head + body)
+    await conn.writer.drain()
+
+    # Status line, e.g: `HTTP/1.1 200 OK`
+    status_line = await conn.reader.readline()
+    if not status_line:
+        raise EOFError("connection closed before receiving a response")
+    version, status, *_ = status_line.decode("latin-1").split(" ", 2)
+    status = int(status)
+
+    response_headers = {}
+    while True:
+        line = await conn.reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+
+    connection = response_headers.get("connection", "").lower()
+    if connection == "close" or (version == "HTTP/1.0" and connection != "keep-alive"):
+        conn.reusable = False
+
+    if response_headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await conn.reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                # Skip the trailers
+                while (await conn.reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            chunks.append(await conn.reader.readexactly(size))
+            await conn.reader.readexactly(2)
+        response_body = b"".join(chunks)
+    elif "content-length" in response_headers:
+        response_body = await conn.reader.readexactly(
+            int(response_headers["content-length"])
+        )
+    elif status in (204, 304) or 100 <= status < 200:
+        response_body = b""
+    else:
+        # The body ends when the server closes the connection
+        response_body = await conn.reader.read()
+        conn.reusable = False
+
+    return status, response_body
@@ -0,0 +1,469 @@
+"""Profiling of the generation pipeline.
+
+Nothing in this module is used unless profiling is enabled: the `Profiler` wraps the
+pipeline components with timed versions of them, so the pipeline has no extra
+overhead otherwise
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import cProfile
+import fnmatch
+import glob
+import io
+import marshal
+import pstats
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+from datacat.conductor import ConductorIterator
+from datacat.config import Configuration
+from datacat.serializer import Serializer
+from datacat.sink import BufferedSink, Sink
+from datacat.timestamper import Timestamper
+from datacat.typing import LazyData, RawRow, Row
+
+# First line of the text report, used to recognize previous reports
+REPORT_HEADER = "Profiled "
+# Upper bounds (in ms) of the buckets for the event loop stall histogram
+STALL_BUCKETS_MS = (1, 5, 10, 50, 100, 500)
+# Number of frames stored by `tracemalloc` for each allocation, needed to find the
+# stage of the pipeline that made it
+TRACEMALLOC_FRAMES = 25
+
+
+def build(conf: Configuration) -> Profiler | None:
+    """Build the `Profiler` for the given configuration, if any"""
+
+    if conf.profile is None:
+        return None
+
+    path = conf.profile.path
+    if conf.profile.cprofile:
+        _check_output_path(path, conf, _is_stats)
+    _check_output_path(_report_path(path), conf, _is_report)
+
+    return Profiler(
+        conf.profile.path,
+        timers=conf.profile.timers,
+        cprofile=conf.profile.cprofile,
+        tracemalloc=conf.profile.tracemalloc,
+        start_s=conf.profile.start_s,
+        duration_s=conf.profile.duration_s,
+        top=conf.profile.top,
+        stall_interval_s=conf.profile.stall_interval_ms / 1000,
+    )
+
+
+def _report_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.txt")
+
+
+def _check_output_path(path: Path, conf: Configuration, is_previous: Callable):
+    """Make sure that writing the profiling results to `path` does not overwrite
+    the source or any other file that is not a previous result (as told by
+    `is_previous`)
+    """
+    resolved = path.resolve()
+    if conf.source.type == "glob":
+        is_source = fnmatch.fnmatch(str(path), conf.source.glob) or any(
+            resolved == Path(match).resolve()
+            for match in glob.glob(conf.source.glob, recursive=True)
+        )
+    else:
+        is_source = resolved == Path(conf.source.path).resolve()
+    if is_source:
+        raise RuntimeError(f"the profiling results would overwrite the source: {path}")
+
+    if path.exists() and not is_previous(path):
+        raise RuntimeError(
+            f"the profiling results would overwrite a file that is not a profile: "
+            f"{path}"
+        )
+
+
+def _is_stats(path: Path) -> bool:
+    # `cProfile` dumps its stats as a marshalled dict
+    try:
+        with path.open("rb") as f:
+            return isinstance(marshal.load(f), dict)
+    except (EOFError, ValueError, TypeError):
+        return False
+
+
+def _is_report(path: Path) -> bool:
+    with path.open("r", errors="replace") as f:
+        return f.read(len(REPORT_HEADER)) == REPORT_HEADER
+
+
+class StageTimer:
+    """Accumulated timings of a stage of the pipeline"""
+
+    __slots__ = ("name", "count", "total_ns", "max_ns")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, elapsed_ns: int):
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+
+class LoopMonitor:
+    """Measures how late the event loop wakes up from `asyncio.sleep`, which is the
+    time the loop was blocked by some synchronous code
+    """
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.buckets = [0] * (len(STALL_BUCKETS_MS) + 1)
+
+    async def run(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval_s)
+            late_s = time.perf_counter() - before - self.interval_s
+            self.count += 1
+            self.total_s += late_s
+            self.max_s = max(self.max_s, late_s)
+            for i, bound_ms in enumerate(STALL_BUCKETS_MS):
+                if late_s * 1000 < bound_ms:
+                    self.buckets[i] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+
+
+class Profiler:
+    """An object that profiles the generation pipeline.
+
+    Besides the timers of each stage and the event loop monitor, which are active
+    for the whole run, it can run `cProfile` and `tracemalloc` for a window of the run
+    (starting `start_s` seconds after `start` and lasting `duration_s` seconds, or
+    until the end).
+
+    When stopped, the `cProfile` stats (if enabled) are written to `path` (to open
+    with `pstats`, `snakeviz`...) and a text report to `<path>.txt`
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        timers: bool = True,
+        cprofile: bool = False,
+        tracemalloc: bool = False,
+        start_s: float = 0,
+        duration_s: float | None = None,
+        top: int = 20,
+        stall_interval_s: float = 0.01,
+    ):
+        self.path = path
+        self.timers = timers
+        self.cprofile = cprofile
+        self.tracemalloc = tracemalloc
+        self.start_s = start_s
+        self.duration_s = duration_s
+        self.top = top
+        self.stages: dict[str, StageTimer] = {}
+        self.monitor = LoopMonitor(stall_interval_s)
+        self._monitor_task: asyncio.Task | None = None
+        self._profile: cProfile.Profile | None = None
+        self._snapshot: tracemalloc.Snapshot | None = None
+        self._handles: list[asyncio.TimerHandle] = []
+        self._window_open = False
+        self._window_opened_at = 0.0
+        self._window_s = 0.0
+        self._started_at = 0.0
+        self._elapsed_s = 0.0
+
+    def stage(self, name: str) -> StageTimer:
+        if name not in self.stages:
+            self.stages[name] = StageTimer(name)
+        return self.stages[name]
+
+    def wrap_data(self, data: LazyData) -> LazyData:
+        if not self.timers:
+            return data
+        return _timed_data(data, self.stage("source"))
+
+    def wrap_conducted(self, conducted: ConductorIterator) -> ConductorIterator:
+        if not self.timers:
+            return conducted
+        return TimedConductorIterator(conducted, self.stage("conductor"))
+
+    def wrap_timestamper(self, timestamper: Timestamper) -> Timestamper:
+        if not self.timers:
+            return timestamper
+        return TimedTimestamper(timestamper, self.stage("timestamp"))
+
+    def wrap_serializers(self, serializers: list[Serializer]) -> list[Serializer]:
+        """Wrap the serializers, keeping the shared instances shared"""
+        if not self.timers:
+            return serializers
+
+        wrapped: dict[int, Serializer] = {}
+        for i, serializer in enumerate(serializers):
+            if id(serializer) not in wrapped:
+                name = f"serialize[{i}] {serializer.__class__.__name__}"
+                wrapped[id(serializer)] = TimedSerializer(serializer, self.stage(name))
+        return [wrapped[id(serializer)] for serializer in serializers]
+
+    def wrap_sinks(self, sinks: list[BufferedSink]) -> list[Sink]:
+        """Wrap the sinks, timing both the time to put each row in the buffer and the
+        time the inner sink takes to send it
+        """
+        if not self.timers:
+            return sinks
+
+        wrapped = []
+        for i, sink in enumerate(sinks):
+            name = f"sink[{i}] {sink.sink.__class__.__name__}"
+            sink.sink = TimedSink(sink.sink, self.stage(f"{name} (send)"))
+            wrapped.append(TimedSink(sink, self.stage(f"{name} (buffer)")))
+        return wrapped
+
+    def start(self):
+        """Start profiling, must be called from the running event loop"""
+        self._started_at = time.perf_counter()
+        self._monitor_task = asyncio.create_task(self.monitor.run())
+
+        if self.cprofile or self.tracemalloc:
+            loop = asyncio.get_running_loop()
+            self._handles.append(loop.call_later(self.start_s, self._open_window))
+            if self.duration_s is not None:
+                self._handles.append(
+                    loop.call_later(self.start_s + self.duration_s, self._close_window)
+                )
+
+    async def stop(self):
+        """Stop profiling and write the results"""
+        if self._monitor_task is None:
+            # Never started
+            return
+
+        self._elapsed_s = time.perf_counter() - self._started_at
+        for handle in self._handles:
+            handle.cancel()
+        self._close_window()
+        self._monitor_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._monitor_task
+
+        if self._profile is not None:
+            self._profile.dump_stats(self.path)
+        _report_path(self.path).write_text(self.report())
+
+    def report(self) -> str:
+        """A human readable report of the results"""
+        out = io.StringIO()
+        out.write(f"{REPORT_HEADER}{self._elapsed_s:.3f}s\n")
+        if self._window_s:
+            tools = " and ".join(
+                name
+                for name, enabled in (
+                    ("cProfile", self.cprofile),
+                    ("tracemalloc", self.tracemalloc),
+                )
+                if enabled
+            )
+            out.write(
+                f"NOTE: {tools} ran for {self._window_s:.3f}s of the run, the stage "
+                f"timers and event loop stalls include their overhead\n"
+            )
+
+        if self.stages:
+            out.write("\n== Stages ==\n")
+            out.write(
+                f"{'stage':<40} {'calls':>10} {'total (s)':>10} "
+                f"{'mean (us)':>10} {'max (ms)':>10}\n"
+            )
+            for stage in self.stages.values():
+                total_ns = stage.total_ns
+                if stage.name == "conductor" and "source" in self.stages:
+                    # Pulling rows from the source happens inside of the conductor
+                    total_ns -= self.stages["source"].total_ns
+                mean_us = total_ns / stage.count / 1000 if stage.count else 0
+                out.write(
+                    f"{stage.name:<40} {stage.count:>10} {total_ns / 1e9:>10.3f} "
+                    f"{mean_us:>10.1f} {stage.max_ns / 1e6:>10.3f}\n"
+                )
+            out.write(
+                "(`conductor` includes its sleeps and excludes the time in `source`)\n"
+            )
+
+        monitor = self.monitor
+        out.write("\n== Event loop stalls ==\n")
+        mean_ms = monitor.total_s / monitor.count * 1000 if monitor.count else 0
+        out.write(
+            f"wakeups: {monitor.count}, total late: {monitor.total_s:.3f}s, "
+            f"mean: {mean_ms:.3f}ms, max: {monitor.max_s * 1000:.3f}ms\n"
+        )
+        lower_ms = 0
+        for bound_ms, count in zip(STALL_BUCKETS_MS, monitor.buckets):
+            out.write(f"  [{lower_ms}, {bound_ms}) ms: {count}\n")
+            lower_ms = bound_ms
+        out.write(f"  >= {lower_ms} ms: {monitor.buckets[-1]}\n")
+
+        if self._profile is not None:
+            out.write(f"\n== Top {self.top} functions (cumulative) ==\n")
+            stats = pstats.Stats(self._profile, stream=out)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+
+        if self._snapshot is not None:
+            out.write(f"\n== Top {self.top} allocations per stage ==\n")
+            for stage, stats in _allocations_per_stage(self._snapshot).items():
+                size = sum(stat.size for stat in stats)
+                out.write(f"{stage}: {size / 1024:.1f} KiB\n")
+                for stat in stats[: self.top]:
+                    frame = stat.traceback[-1]
+                    out.write(
+                        f"  {stat.size / 1024:>10.1f} KiB {stat.count:>8} blocks  "
+                        f"{frame.filename}:{frame.lineno}\n"
+                    )
+
+        return out.getvalue()
+
+    def _open_window(self):
+        if self._window_open:
+            return
+        self._window_open = True
+        self._window_opened_at = time.perf_counter()
+        if self.cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        if self.tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def _close_window(self):
+        if not self._window_open:
+            return
+        self._window_open = False
+        self._window_s += time.perf_counter() - self._window_opened_at
+        if self._profile is not None:
+            self._profile.disable()
+        if self.tracemalloc:
+            self._snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+
+def _allocations_per_stage(
+    snapshot: tracemalloc.Snapshot,
+) -> dict[str, list[tracemalloc.Statistic]]:
+    """Group the allocations by the datacat module that made them.
+
+    Each allocation belongs to the innermost datacat module in its traceback (e.g:
+    `serializer` for the allocations within `json.dumps`)
+    """
+    package_dir = str(Path(__file__).parent)
+    result: dict[str, list[tracemalloc.Statistic]] = {}
+    for stat in snapshot.statistics("traceback"):
+        stage = "other"
+        for frame in reversed(stat.traceback):
+            if frame.filename.startswith(package_dir):
+                stage = Path(frame.filename).stem
+                break
+        result.setdefault(stage, []).append(stat)
+
+    return dict(
+        sorted(result.items(), key=lambda item: -sum(stat.size for stat in item[1]))
+    )
+
+
+def _timed_data(data: LazyData, timer: StageTimer) -> LazyData:
+    iterator = iter(data)
+    while True:
+        before = time.perf_counter_ns()
+        try:
+            row = next(iterator)
+        except StopIteration:
+            return
+        timer.add(time.perf_counter_ns() - before)
+        yield row
+
+
+class TimedConductorIterator(ConductorIterator):
+    """A `ConductorIterator` that times how long it takes to produce each row"""
+
+    def __init__(self, inner: ConductorIterator, timer: StageTimer):
+        self.inner = inner
+        self.timer = timer
+
+    async def __anext__(self) -> Row:
+        before = time.perf_counter_ns()
+        try:
+            return await self.inner.__anext__()
+        finally:
+            self.timer.add(time.perf_counter_ns() - before)
+
+    @property
+    def anchor(self) -> str | None:
+        return self.inner.anchor
+
+
+class TimedTimestamper(Timestamper):
+    """A `Timestamper` that times how long it takes to generate each timestamp"""
+
+    def __init__(self, inner: Timestamper, timer: StageTimer):
+        super().__init__(field_name=inner.field_name)
+        self.inner = inner
+        self.timer = timer
+
+    def timestamp(self):
+        before = time.perf_counter_ns()
+        ts = self.inner.timestamp()
+        self.timer.add(time.perf_counter_ns() - before)
+        return ts
+
+
+class TimedSerializer(Serializer):
+    """A `Serializer` that times how long it takes to serialize each row"""
+
+    def __init__(self, inner: Serializer, timer: StageTimer):
+        self.inner = inner
+        self.timer = timer
+
+    def serialize(self, row: Row) -> str:
+        before = time.perf_counter_ns()
+        serialized = self.inner.serialize(row)
+        self.timer.add(time.perf_counter_ns() - before)
+        return serialized
+
+
+class TimedSink(Sink):
+    """A `Sink` that times how long it takes to output each row"""
+
+    def __init__(self, inner: Sink, timer: StageTimer):
+        self.inner = inner
+        self.timer = timer
+
+    def __repr__(self) -> str:
+        return repr(self.inner)
+
+    @property
+    def acked(self) -> int:
+        return self.inner.acked
+
+    async def output(self, row: RawRow):
+        before = time.perf_counter_ns()
+        try:
+            await self.inner.output(row)
+        finally:
+            self.timer.add(time.perf_counter_ns() - before)
+
+    async def init(self):
+        await self.inner.init()
+
+    async def teardown(self):
+        await self.inner.teardown()
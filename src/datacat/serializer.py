@@ -4,18 +4,42 @@ from __future__ import annotations
 import abc
 import json
 
-from datacat.config import Configuration
+from datacat.config import Configuration, SinkConfig
 from datacat.typing import Row
 
 
-def build(conf: Configuration) -> Serializer:
-    """Build the right `Serializer` for the given configuration"""
+def build(conf: Configuration, sink_conf: SinkConfig | None = None) -> Serializer:
+    """Build the right `Serializer` for the given configuration.
 
-    if conf.format.type == "json":
+    If `sink_conf` is given, its `format` takes precedence over the top level one
+    """
+    format_conf = conf.format
+    if sink_conf is not None and sink_conf.format is not None:
+        format_conf = sink_conf.format
+
+    if format_conf.type == "json":
         return JsonSerializer()
     raise ValueError("Unknown serializer configuration")
 
 
+def build_all(conf: Configuration) -> list[Serializer]:
+    """Build a `Serializer` for each of the configured sinks, in the same order as
+    `conf.sinks`.
+
+    Sinks with the same format share the same `Serializer` instance, so that each row
+    only needs to be serialized once per format
+    """
+    serializers: dict[str, Serializer] = {}
+    result = []
+    for sink_conf in conf.sinks:
+        format_conf = sink_conf.format or conf.format
+        key = format_conf.model_dump_json()
+        if key not in serializers:
+            serializers[key] = build(conf, sink_conf)
+        result.append(serializers[key])
+    return result
+
+
 class Serializer(abc.ABC):
     """An object that transforms a row into a serialized format"""
 
@@ -2,21 +2,81 @@
 from __future__ import annotations
 
 import abc
+import asyncio
+import base64
+import collections
+import functools
+import json
+import random
+import ssl
+import sys
+import tempfile
+import urllib.parse
 
-from datacat.config import Configuration
+from datacat import network
+from datacat.config import (
+    BatchConfig,
+    BufferConfig,
+    Configuration,
+    RetryConfig,
+    SinkConfig,
+)
 from datacat.typing import RawRow
 
 # TODO(alvaro): Maybe serialization should be tied to the Sink?
 
 
-def build(conf: Configuration) -> Sink:
-    """Build the right `Sink` for the given configuration"""
+def build(conf: Configuration) -> list[BufferedSink]:
+    """Build the (buffered) `Sink`s for the given configuration, in the same order
+    as `conf.sinks`
+    """
+    default_policy = "spill" if len(conf.sinks) > 1 else "block"
+    return [
+        BufferedSink(
+            build_sink(sink_conf),
+            sink_conf.buffer,
+            policy=sink_conf.buffer.policy or default_policy,
+        )
+        for sink_conf in conf.sinks
+    ]
+
+
+def build_sink(sink_conf: SinkConfig) -> Sink:
+    """Build the right `Sink` for the given sink configuration"""
 
-    if conf.sink.type == "console":
+    if sink_conf.type == "console":
         return ConsoleSink()
-    if conf.sink.type == "kafka":
+    if sink_conf.type == "kafka":
         return KafkaSink(
-            bootstrap_servers=conf.sink.bootstrap_servers, topic=conf.sink.topic
+            bootstrap_servers=sink_conf.bootstrap_servers, topic=sink_conf.topic
+        )
+    if sink_conf.type == "tcp":
+        return TcpSink(
+            host=sink_conf.host,
+            port=sink_conf.port,
+            pool_size=sink_conf.pool_size or sink_conf.max_in_flight,
+            batch=sink_conf.batch,
+            retry=sink_conf.retry,
+            max_in_flight=sink_conf.max_in_flight,
+        )
+    if sink_conf.type == "udp":
+        return UdpSink(
+            host=sink_conf.host,
+            port=sink_conf.port,
+            batch=sink_conf.batch,
+            retry=sink_conf.retry,
+            max_in_flight=sink_conf.max_in_flight,
+        )
+    if sink_conf.type == "http":
+        return HttpSink(
+            url=sink_conf.url,
+            method=sink_conf.method,
+            headers={"Content-Type": sink_conf.content_type, **sink_conf.headers},
+            timeout_s=sink_conf.timeout_s,
+            pool_size=sink_conf.pool_size or sink_conf.max_in_flight,
+            batch=sink_conf.batch,
+            retry=sink_conf.retry,
+            max_in_flight=sink_conf.max_in_flight,
         )
     raise ValueError("Unknown sink configuration")
 
@@ -24,6 +84,10 @@ def build(conf: Configuration) -> Sink:
 class Sink(abc.ABC):
     """An object that outputs datasets into some format"""
 
+    # Number of rows (in output order, without gaps) that the destination has
+    # confirmed, which is what a checkpoint can safely rely on
+    acked: int = 0
+
     @abc.abstractmethod
     async def output(self, row: RawRow):
         ...
@@ -40,6 +104,7 @@ class ConsoleSink(Sink):
 
     async def output(self, row: RawRow):
         print(row)
+        self.acked += 1
 
 
 class KafkaSink(Sink):
@@ -53,6 +118,7 @@ class KafkaSink(Sink):
     async def output(self, row: RawRow):
         assert self.producer is not None
         await self.producer.send_and_wait(self.topic, row.encode())
+        self.acked += 1
 
     async def init(self):
         import aiokafka
@@ -64,3 +130,438 @@ class KafkaSink(Sink):
 
     async def teardown(self):
         await self.producer.stop()
+
+
+class BatchingSink(Sink):
+    """A sink that groups the rows in batches and sends each batch in one go.
+
+    A batch is sent when it reaches `batch.max_rows` rows or `batch.max_bytes` bytes,
+    or when its first row has waited for `batch.linger_ms`. Up to `max_in_flight`
+    batches are sent concurrently, and failed batches are retried with exponential
+    backoff, so the delivery is at-least-once.
+    """
+
+    # Bytes added after each row when sending it, which count towards `max_bytes`
+    delimiter = b""
+
+    def __init__(self, batch: BatchConfig, retry: RetryConfig, max_in_flight: int):
+        self.max_rows = batch.max_rows
+        self.max_bytes = batch.max_bytes
+        self.linger_s = batch.linger_ms / 1000
+        self.retry = retry
+        self.max_in_flight = max_in_flight
+        self._batch: list[bytes] = []
+        self._batch_bytes = 0
+        self._linger_handle: asyncio.TimerHandle | None = None
+        self._in_flight: asyncio.Semaphore | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._error: BaseException | None = None
+        # The batches can be sent out of order, so `acked` only moves forward once
+        # all the previous batches are sent too
+        self._next_seq = 0
+        self._acked_seq = 0
+        self._sent: dict[int, int] = {}
+
+    @abc.abstractmethod
+    async def send_batch(self, batch: list[bytes]):
+        """Send all the (encoded) rows in `batch`"""
+        ...
+
+    async def output(self, row: RawRow):
+        if self._error is not None:
+            raise RuntimeError(f"sink {self!r} failed") from self._error
+
+        data = row.encode()
+        size = len(data) + len(self.delimiter)
+        if self._batch and self._batch_bytes + size > self.max_bytes:
+            await self._flush()
+
+        self._batch.append(data)
+        self._batch_bytes += size
+        if (
+            len(self._batch) >= self.max_rows
+            or self._batch_bytes >= self.max_bytes
+            or not self.linger_s
+        ):
+            await self._flush()
+        elif len(self._batch) == 1:
+            loop = asyncio.get_running_loop()
+            self._linger_handle = loop.call_later(self.linger_s, self._on_linger)
+
+    async def init(self):
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+
+    async def teardown(self):
+        try:
+            await self._flush()
+            while self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            if self._error is not None:
+                raise RuntimeError(f"sink {self!r} failed") from self._error
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Release the resources of the sink, after every batch has been sent"""
+        pass
+
+    def _on_linger(self):
+        self._linger_handle = None
+        task = asyncio.create_task(self._flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self):
+        if self._linger_handle is not None:
+            self._linger_handle.cancel()
+            self._linger_handle = None
+        if not self._batch:
+            return
+
+        batch = self._batch
+        self._batch = []
+        self._batch_bytes = 0
+        seq = self._next_seq
+        self._next_seq += 1
+
+        # Wait for a free slot so that the number of in-flight batches is bounded
+        assert self._in_flight is not None
+        await self._in_flight.acquire()
+        task = asyncio.create_task(self._send_with_retry(batch))
+        self._tasks.add(task)
+        task.add_done_callback(functools.partial(self._on_sent, seq, len(batch)))
+
+    def _on_sent(self, seq: int, size: int, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._in_flight.release()
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self._error = self._error or task.exception()
+            return
+
+        self._sent[seq] = size
+        while self._acked_seq in self._sent:
+            self.acked += self._sent.pop(self._acked_seq)
+            self._acked_seq += 1
+
+    async def _send_with_retry(self, batch: list[bytes]):
+        backoff_s = self.retry.backoff_ms / 1000
+        max_backoff_s = self.retry.max_backoff_ms / 1000
+        for attempt in range(1, self.retry.max_attempts + 1):
+            try:
+                return await self.send_batch(batch)
+            except network.RETRYABLE_ERRORS:
+                if attempt == self.retry.max_attempts:
+                    raise
+            # Add some jitter so that the concurrent requests do not retry in lockstep
+            await asyncio.sleep(backoff_s * random.uniform(0.5, 1))
+            backoff_s = min(backoff_s * 2, max_backoff_s)
+
+
+class TcpSink(BatchingSink):
+    """A sink that sends the rows as newline delimited lines over TCP"""
+
+    delimiter = b"\n"
+
+    def __init__(self, host: str, port: int, pool_size: int, **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.pool: network.ConnectionPool | None = None
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.host}:{self.port})"
+
+    async def init(self):
+        await super().init()
+        self.pool = network.ConnectionPool(self.host, self.port, self.pool_size)
+
+    async def send_batch(self, batch: list[bytes]):
+        assert self.pool is not None
+        async with self.pool.connection() as conn:
+            conn.writer.write(b"".join(row + self.delimiter for row in batch))
+            await conn.writer.drain()
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+
+class UdpSink(BatchingSink):
+    """A sink that sends each row as a single UDP datagram (syslog style)"""
+
+    def __init__(self, host: str, port: int, **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+        self.port = port
+        self.transport: asyncio.DatagramTransport | None = None
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.host}:{self.port})"
+
+    async def init(self):
+        await super().init()
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=(self.host, self.port)
+        )
+
+    async def send_batch(self, batch: list[bytes]):
+        assert self.transport is not None
+        # NOTE(alvaro): `sendto` does not block, the batching only saves the
+        # overhead of going through the whole pipeline for each row
+        for row in batch:
+            self.transport.sendto(row)
+
+    async def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+class HttpSink(BatchingSink):
+    """A sink that sends the batches of rows as the (newline delimited) body of an
+    HTTP request, for bulk ingestion endpoints.
+
+    The credentials in the url (if any) are sent with basic authentication
+    """
+
+    delimiter = b"\n"
+
+    def __init__(
+        self,
+        url: str,
+        method: str,
+        headers: dict[str, str],
+        timeout_s: float,
+        pool_size: int,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.url = url
+        self.method = method
+        self.headers = dict(headers)
+        self.timeout_s = timeout_s
+        self.pool_size = pool_size
+        self.pool: network.ConnectionPool | None = None
+
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise ValueError(f"invalid HTTP sink url: {url}")
+        # NOTE(alvaro): Not `netloc`, which also has the credentials
+        self.host = parsed.hostname
+        if ":" in self.host:
+            self.host = f"[{self.host}]"
+        if parsed.port is not None:
+            self.host += f":{parsed.port}"
+        if parsed.username is not None and "Authorization" not in self.headers:
+            credentials = urllib.parse.unquote(parsed.username)
+            if parsed.password is not None:
+                credentials += f":{urllib.parse.unquote(parsed.password)}"
+            token = base64.b64encode(credentials.encode()).decode()
+            self.headers["Authorization"] = f"Basic {token}"
+        self.path = parsed.path or "/"
+        if parsed.query:
+            self.path += f"?{parsed.query}"
+        self._hostname = parsed.hostname
+        self._port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self._ssl_context = (
+            ssl.create_default_context() if parsed.scheme == "https" else None
+        )
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.host}{self.path})"
+
+    async def init(self):
+        await super().init()
+        self.pool = network.ConnectionPool(
+            self._hostname, self._port, self.pool_size, ssl_context=self._ssl_context
+        )
+
+    async def send_batch(self, batch: list[bytes]):
+        assert self.pool is not None
+        body = b"".join(row + self.delimiter for row in batch)
+        async with self.pool.connection() as conn:
+            status, response = await asyncio.wait_for(
+                network.http_request(
+                    conn, self.method, self.host, self.path, self.headers, body
+                ),
+                self.timeout_s,
+            )
+        if status == 429 or status >= 500:
+            raise network.RetryableHttpError(status, response)
+        if not 200 <= status < 300:
+            raise network.HttpError(status, response)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+
+class BufferedSink(Sink):
+    """A sink that decouples an inner `Sink` from the producer with a bounded buffer.
+
+    The rows are handed to the inner sink by a background task, so a slow sink only
+    slows down the producer when its buffer is full and the policy is `block` (or
+    `spill`, once the spill file is full).
+
+    `policy` overrides the one of `buffer`, which can be unset
+    """
+
+    def __init__(self, sink: Sink, buffer: BufferConfig, policy: str | None = None):
+        self.sink = sink
+        self.policy = policy or buffer.policy or "block"
+        self.spill_dir = buffer.spill_dir
+        self.spill_max_bytes = buffer.spill_max_bytes
+        self.queue: asyncio.Queue[RawRow] = asyncio.Queue(maxsize=buffer.size)
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.spilled = 0
+        # Number of rows sent to the inner sink before each of the dropped rows
+        self._drops: collections.deque[int] = collections.deque()
+        self._acked_drops = 0
+        # Rows written to the spill file that have not been sent yet, and the size
+        # of the file (it is only emptied once every row in it has been sent)
+        self._spill_pending = 0
+        self._spill_bytes = 0
+        self._spill_unflushed = False
+        self._spill_full_warned = False
+        self._spill_writer = None
+        self._spill_reader = None
+        # Set whenever there are no rows pending / no rows in the spill file
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._spill_drained = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self._error: BaseException | None = None
+
+    @property
+    def pending(self) -> int:
+        """Number of rows in the buffer that have not been handed to the sink yet"""
+        return self.received - self.delivered - self.dropped
+
+    @property
+    def acked(self) -> int:
+        # The dropped rows count as acknowledged once every row before them is
+        inner_acked = self.sink.acked
+        while self._drops and self._drops[0] <= inner_acked:
+            self._drops.popleft()
+            self._acked_drops += 1
+        return inner_acked + self._acked_drops
+
+    async def output(self, row: RawRow):
+        if self._error is not None:
+            raise RuntimeError(f"sink {self.sink!r} failed") from self._error
+
+        self.received += 1
+        if self._spill_pending and self._spill_bytes >= self.spill_max_bytes:
+            if not self._spill_full_warned:
+                self._spill_full_warned = True
+                print(
+                    f"{self.sink.__class__.__name__} spill file is full, waiting for "
+                    f"the sink",
+                    file=sys.stderr,
+                )
+            # Wait until the spill file is sent and emptied, and then go on normally
+            await self._spill_drained.wait()
+            if self._error is not None:
+                raise RuntimeError(f"sink {self.sink!r} failed") from self._error
+
+        # NOTE(alvaro): Once we start spilling, every row goes through the spill file
+        # until it is drained so that the order of the rows is kept
+        if self._spill_pending:
+            self._spill(row)
+        elif self.policy == "block":
+            await self.queue.put(row)
+        elif not self.queue.full():
+            self.queue.put_nowait(row)
+        elif self.policy == "drop":
+            self._drops.append(self.received - self.dropped - 1)
+            self.dropped += 1
+        else:
+            self._spill(row)
+
+        if self.pending:
+            self._drained.clear()
+
+    async def init(self):
+        await self.sink.init()
+        self._worker = asyncio.create_task(self._drain())
+        self._worker.add_done_callback(self._on_worker_done)
+
+    async def teardown(self):
+        try:
+            if self._worker is not None:
+                # Wait for every buffered row to be sent (or for the worker to fail)
+                await self._drained.wait()
+                self._worker.cancel()
+                await asyncio.wait({self._worker})
+            if self._spill_writer is not None:
+                self._spill_reader.close()
+                self._spill_writer.close()
+            if self.dropped:
+                print(
+                    f"{self.sink.__class__.__name__} dropped {self.dropped} rows",
+                    file=sys.stderr,
+                )
+            if self._error is not None:
+                raise RuntimeError(f"sink {self.sink!r} failed") from self._error
+        finally:
+            await self.sink.teardown()
+
+    async def _drain(self):
+        while True:
+            if not self.queue.empty():
+                row = self.queue.get_nowait()
+            elif self._spill_pending:
+                row = self._unspill()
+            else:
+                row = await self.queue.get()
+            await self.sink.output(row)
+            self.delivered += 1
+            if not self.pending:
+                self._drained.set()
+
+    def _on_worker_done(self, task: asyncio.Task):
+        if task.cancelled() or task.exception() is None:
+            return
+        self._error = task.exception()
+        # Unblock any producer waiting for space in the buffer and teardown
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self._spill_drained.set()
+        self._drained.set()
+
+    def _spill(self, row: RawRow):
+        if self._spill_writer is None:
+            self._spill_writer = tempfile.NamedTemporaryFile(
+                "w", prefix="datacat-spill-", suffix=".ndjson", dir=self.spill_dir
+            )
+            self._spill_reader = open(self._spill_writer.name, "r")
+
+        # Rows are stored as JSON strings so that they can contain newlines
+        line = json.dumps(row) + "\n"
+        self._spill_writer.write(line)
+        self._spill_bytes += len(line)
+        self._spill_unflushed = True
+        self._spill_pending += 1
+        self.spilled += 1
+        self._spill_drained.clear()
+
+    def _unspill(self) -> RawRow:
+        if self._spill_unflushed:
+            # Only flush when the rows are read back, not for every written row
+            self._spill_writer.flush()
+            self._spill_unflushed = False
+        row = json.loads(self._spill_reader.readline())
+        self._spill_pending -= 1
+        if not self._spill_pending:
+            # Everything has been sent, reuse the file from the start
+            self._spill_writer.seek(0)
+            self._spill_writer.truncate()
+            self._spill_reader.seek(0)
+            self._spill_bytes = 0
+            self._spill_drained.set()
+        return row
@@ -2,10 +2,16 @@
 from __future__ import annotations
 
 import abc
+import dataclasses
 from pathlib import Path
 
 from datacat.config import Configuration
-from datacat.typing import Data
+from datacat.typing import Data, LazyData
+
+# Number of rows between the entries of the sparse index of byte offsets for NdJSON
+NDJSON_INDEX_INTERVAL = 10_000
+# Size of the blocks of bytes parsed at once for CSV (each block is an index entry)
+CSV_BLOCK_SIZE = 1024 * 1024
 
 
 def build(conf: Configuration) -> Source:
@@ -23,63 +29,274 @@ def build(conf: Configuration) -> Source:
         raise ValueError("Unknown source configuration")
 
 
+@dataclasses.dataclass
+class SourcePosition:
+    """The position of the next row to be read from a `Source`, which can be used to
+    resume reading from that point.
+
+    Besides the index of the row, it stores the information the source needs to jump
+    close to that row without reading the rows before it
+    """
+
+    # Index of the row within the file
+    row: int = 0
+    # Byte offset of the row `offset_row` (CSV / NdJSON)
+    offset: int | None = None
+    offset_row: int = 0
+    # Row group that contains the row (Parquet)
+    row_group: int | None = None
+    file: str | None = None
+    # Column types of the whole file, as a base64 encoded Arrow schema (CSV)
+    schema: str | None = None
+    # Index of the file within the sorted results of the glob (`GlobFileSource`)
+    file_index: int | None = None
+
+
 class Source(abc.ABC):
     """An object that encapsulates the source of some data"""
 
-    @abc.abstractmethod
     def load(self) -> Data:
+        return list(self.stream())
+
+    @abc.abstractmethod
+    def stream(self, start: SourcePosition | None = None) -> LazyData:
+        """Lazily read the rows, starting from the `start` position if given.
+
+        While iterating, `position` points to the row after the last one yielded
+        """
+        ...
+
+    @property
+    @abc.abstractmethod
+    def position(self) -> SourcePosition:
         ...
 
 
 class FileSource(Source):
-    """A source"""
+    """A source that reads the data from a single file"""
 
     def __init__(self, path: Path):
         self.path = path
+        self._row = 0
+        self._offset: int | None = None
+        self._offset_row = 0
+        self._row_group: int | None = None
+        self._schema: str | None = None
+
+    @property
+    def position(self) -> SourcePosition:
+        return SourcePosition(
+            row=self._row,
+            offset=self._offset,
+            offset_row=self._offset_row,
+            row_group=self._row_group,
+            file=str(self.path),
+            schema=self._schema,
+        )
+
+    def stream(self, start: SourcePosition | None = None) -> LazyData:
+        start = start or SourcePosition()
+        if start.file is not None and start.file != str(self.path):
+            raise RuntimeError(f"the position is for {start.file}, not {self.path}")
+
+        self._row = start.row
+        self._offset = start.offset
+        self._offset_row = start.offset_row
+        self._row_group = start.row_group
+        self._schema = start.schema
+        return self._stream(start)
 
     @abc.abstractmethod
-    def load(self) -> Data:
+    def _stream(self, start: SourcePosition) -> LazyData:
         ...
 
 
 class CsvSource(FileSource):
-    """A source that comes from a CSV file"""
+    """A source that comes from a CSV file.
 
-    def load(self) -> Data:
+    The file is parsed in blocks of rows, so only one block is in memory at a time.
+    The column types are inferred from the whole file (like reading it in one go
+    does) so that every block gets the same types, and stored in the position so
+    that resuming does not need to infer them again
+    """
+
+    def _stream(self, start: SourcePosition) -> LazyData:
         import pyarrow.csv
 
-        # TODO(alvaro): Add support for limiting the number of rows to load
-        table = pyarrow.csv.read_csv(self.path)
-        return table.to_pylist()
+        if self._schema is None:
+            self._schema = _encode_schema(self._infer_schema())
+        convert_options = pyarrow.csv.ConvertOptions(
+            column_types=_decode_schema(self._schema)
+        )
+
+        with self.path.open("rb") as f:
+            header = self._read_block(f, 1)
+            block_row = 0
+            if start.offset is not None:
+                f.seek(start.offset)
+                block_row = start.offset_row
+
+            while True:
+                offset = f.tell()
+                block = self._read_block(f, CSV_BLOCK_SIZE)
+                if not block:
+                    break
+                table = self._parse(header, block, convert_options)
+
+                self._offset = offset
+                self._offset_row = block_row
+                rows = table.to_pylist()
+                for i in range(max(0, start.row - block_row), len(rows)):
+                    self._row = block_row + i + 1
+                    yield rows[i]
+                block_row += len(rows)
+
+    def _infer_schema(self):
+        """Infer the column types of the whole file, one block at a time"""
+        import pyarrow
+
+        types: dict[str, pyarrow.DataType] = {}
+        with self.path.open("rb") as f:
+            header = self._read_block(f, 1)
+            while block := self._read_block(f, CSV_BLOCK_SIZE):
+                for field in self._parse(header, block).schema:
+                    previous = types.get(field.name)
+                    types[field.name] = (
+                        field.type
+                        if previous is None
+                        else _unify_types(previous, field.type)
+                    )
+
+        if not types:
+            # No rows, only the header
+            header_table = self._parse(header, b"")
+            types = {field.name: field.type for field in header_table.schema}
+        return pyarrow.schema(list(types.items()))
+
+    @staticmethod
+    def _read_block(f, size: int) -> bytes:
+        """Read around `size` bytes, up to the end of a row.
+
+        Quoted fields can contain newlines, so the block only ends at a newline when
+        all its quotes are closed (escaped quotes are doubled, so they do not change
+        the count)
+        """
+        block = f.read(size)
+        quotes = block.count(b'"')
+        while block and (quotes % 2 or not block.endswith(b"\n")):
+            line = f.readline()
+            if not line:
+                break
+            block += line
+            quotes += line.count(b'"')
+        return block
+
+    @staticmethod
+    def _parse(header: bytes, block: bytes, convert_options=None):
+        import io
+
+        import pyarrow.csv
+
+        parse_options = pyarrow.csv.ParseOptions(newlines_in_values=True)
+        return pyarrow.csv.read_csv(
+            io.BytesIO(header + block),
+            parse_options=parse_options,
+            convert_options=convert_options,
+        )
+
+
+def _unify_types(a, b):
+    """The type of a column that has values of types `a` and `b` (in different
+    blocks), following the inference of `pyarrow.csv`
+    """
+    import pyarrow
+
+    if a == b or pyarrow.types.is_null(b):
+        return a
+    if pyarrow.types.is_null(a):
+        return b
+    numeric = (pyarrow.types.is_integer, pyarrow.types.is_floating)
+    if any(f(a) for f in numeric) and any(f(b) for f in numeric):
+        return pyarrow.float64()
+    # NOTE(alvaro): Other mixes (e.g: dates and timestamps) are rare enough to just
+    # keep them as strings, which can hold any value
+    return pyarrow.string()
+
+
+def _encode_schema(schema) -> str:
+    import base64
+
+    return base64.b64encode(schema.serialize().to_pybytes()).decode()
+
+
+def _decode_schema(data: str):
+    import base64
+
+    import pyarrow
+    import pyarrow.ipc
+
+    return pyarrow.ipc.read_schema(pyarrow.py_buffer(base64.b64decode(data)))
 
 
 class ParquetSource(FileSource):
     """A source that comes from a parquet file"""
 
-    def load(self) -> Data:
+    def _stream(self, start: SourcePosition) -> LazyData:
         import pyarrow.parquet
 
-        # TODO(alvaro): Add support for limiting the number of rows to load
-        table = pyarrow.parquet.read_table(self.path)
-        return table.to_pylist()
+        parquet_file = pyarrow.parquet.ParquetFile(self.path)
+        group_row = 0
+        for i in range(parquet_file.num_row_groups):
+            num_rows = parquet_file.metadata.row_group(i).num_rows
+            if group_row + num_rows <= start.row:
+                # Skip the whole row group only looking at the metadata
+                group_row += num_rows
+                continue
+
+            self._row_group = i
+            rows = parquet_file.read_row_group(i).to_pylist()
+            for j in range(max(0, start.row - group_row), num_rows):
+                self._row = group_row + j + 1
+                yield rows[j]
+            group_row += num_rows
 
 
 class NdJsonSource(FileSource):
     """A source that comes from a NdJSON (newline delimited JSON) file"""
 
-    def load(self) -> Data:
+    def _stream(self, start: SourcePosition) -> LazyData:
         import json
 
-        with self.path.open("r") as f:
-            data = [json.loads(line.strip()) for line in f.readlines()]
+        with self.path.open("rb") as f:
+            offset, row = 0, 0
+            if start.offset is not None:
+                f.seek(start.offset)
+                offset, row = start.offset, start.offset_row
+
+            for line in f:
+                line_offset = offset
+                offset += len(line)
+                if not line.strip():
+                    continue
 
-        return data
+                if row % NDJSON_INDEX_INTERVAL == 0:
+                    self._offset = line_offset
+                    self._offset_row = row
+                row += 1
+                if row <= start.row:
+                    continue
+
+                self._row = row
+                yield json.loads(line)
 
 
 class JsonSource(FileSource):
-    """A source that comes from a file that contains JSON array of objects"""
+    """A source that comes from a file that contains JSON array of objects.
 
-    def load(self) -> Data:
+    The whole file needs to be parsed, so resuming only skips the rows already read
+    """
+
+    def _stream(self, start: SourcePosition) -> LazyData:
         import json
 
         with self.path.open("r") as f:
@@ -89,23 +306,57 @@ class JsonSource(FileSource):
             raise ValueError(
                 "invalid format for JSON source: it should be an array of objects"
             )
-        return data
+
+        for i in range(start.row, len(data)):
+            self._row = i + 1
+            yield data[i]
 
 
 class GlobFileSource(Source):
-    """A source that represents a glob of files that should be loaded"""
+    """A source that represents a glob of files that should be loaded.
+
+    The files are read in (sorted) path order
+    """
 
     # NOTE(alvaro): Technically we could support loading a glob of different file types
     # and detect the relevant source for each... but not interested for now
     def __init__(self, glob: str, source_class: type[FileSource]):
         self.glob = glob
         self.source_class = source_class
+        self._file_index = 0
+        self._source: FileSource | None = None
 
-    def load(self) -> Data:
+    @property
+    def position(self) -> SourcePosition:
+        if self._source is None:
+            return SourcePosition(file_index=self._file_index)
+        return dataclasses.replace(self._source.position, file_index=self._file_index)
+
+    def stream(self, start: SourcePosition | None = None) -> LazyData:
         import glob
 
-        data = []
-        for result in glob.glob(self.glob, recursive=True):
+        paths = sorted(glob.glob(self.glob, recursive=True))
+        first = 0
+        if start is not None and start.file_index is not None:
+            first = start.file_index
+            if (
+                start.file is not None
+                and first < len(paths)
+                and str(Path(paths[first])) != start.file
+            ):
+                raise RuntimeError(
+                    f"the files matching {self.glob} changed: expected {start.file} "
+                    f"but found {paths[first]}"
+                )
+        else:
+            start = None
+
+        self._file_index = first
+        self._source = None
+        return self._stream(paths[first:], start)
+
+    def _stream(self, paths: list[str], start: SourcePosition | None) -> LazyData:
+        for result in paths:
             path = Path(result)
 
             # TODO(alvaro): Proper file validation
@@ -113,10 +364,15 @@ class GlobFileSource(Source):
             if not path.is_file():
                 raise RuntimeError("glob must only return files")
 
-            source = self.source_class(path=path)
-            source_data = source.load()
-            data.extend(source_data)
-        return data
+            if self._source is not None:
+                self._file_index += 1
+            self._source = self.source_class(path=path)
+            file_start = None
+            if start is not None:
+                # Only the first file is resumed from the middle
+                file_start = dataclasses.replace(start, file_index=None)
+                start = None
+            yield from self._source.stream(file_start)
 
 
 FILE_SOURCE_TYPE_MAP: dict[str, type[FileSource]] = {
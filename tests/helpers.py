@@ -0,0 +1,33 @@
+"""Helpers shared by the tests"""
+from __future__ import annotations
+
+import asyncio
+import time
+
+from datacat.sink import Sink
+from datacat.typing import RawRow
+
+
+class RecordingSink(Sink):
+    """A sink that records the rows it receives, and the time at which it did.
+
+    Each row takes `delay_s` to be sent, and none is sent until `gate` is set
+    """
+
+    def __init__(self, delay_s: float = 0, fail_at: int | None = None):
+        self.delay_s = delay_s
+        self.fail_at = fail_at
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.rows: list[RawRow] = []
+        self.times: list[float] = []
+
+    async def output(self, row: RawRow):
+        await self.gate.wait()
+        if self.delay_s:
+            await asyncio.sleep(self.delay_s)
+        if len(self.rows) == self.fail_at:
+            raise ValueError("boom")
+        self.rows.append(row)
+        self.times.append(time.monotonic())
+        self.acked += 1
@@ -0,0 +1,205 @@
+"""Tests for the buffered sinks and fanning out to several of them"""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from datacat import config, main, sink
+from datacat.config import BufferConfig
+from datacat.sink import BufferedSink
+from tests.helpers import RecordingSink
+
+
+def rows(n: int, start: int = 0) -> list[str]:
+    return [f"row-{i:04}" for i in range(start, start + n)]
+
+
+def test_block_waits_for_the_sink():
+    async def run():
+        inner = RecordingSink(delay_s=0.001)
+        buffered = BufferedSink(inner, BufferConfig(size=2), policy="block")
+        await buffered.init()
+        max_pending = 0
+        for row in rows(20):
+            await buffered.output(row)
+            max_pending = max(max_pending, buffered.pending)
+        await buffered.teardown()
+        return inner, buffered, max_pending
+
+    inner, buffered, max_pending = asyncio.run(run())
+    assert inner.rows == rows(20)
+    # The buffer, plus the row that is being sent
+    assert max_pending <= 3
+    assert buffered.spilled == buffered.dropped == 0
+
+
+def test_drop_discards_rows_and_acks_them_in_order(capsys):
+    async def run():
+        inner = RecordingSink()
+        inner.gate.clear()
+        buffered = BufferedSink(inner, BufferConfig(size=3), policy="drop")
+        await buffered.init()
+        for row in rows(10):
+            await buffered.output(row)
+        # The first rows are still being sent, so the dropped ones are not acked
+        await asyncio.sleep(0.01)
+        acked_before = buffered.acked
+
+        inner.gate.set()
+        await buffered.teardown()
+        return inner, buffered, acked_before
+
+    inner, buffered, acked_before = asyncio.run(run())
+    assert inner.rows == rows(3)
+    assert buffered.dropped == 7
+    assert acked_before == 0
+    assert buffered.acked == 10
+    assert "dropped 7 rows" in capsys.readouterr().err
+
+
+def test_drop_acks_rows_after_the_ones_before_them():
+    async def run():
+        inner = RecordingSink()
+        inner.gate.clear()
+        buffered = BufferedSink(inner, BufferConfig(size=2), policy="drop")
+        await buffered.init()
+        # Rows 0 and 1 are buffered and 2 is dropped
+        for row in rows(3):
+            await buffered.output(row)
+        inner.gate.set()
+        await asyncio.sleep(0.01)
+        # Row 3 is buffered after the first ones are sent
+        await buffered.output(rows(1, start=3)[0])
+        acked = buffered.acked
+        await buffered.teardown()
+        return inner, buffered, acked
+
+    inner, buffered, acked = asyncio.run(run())
+    assert acked == 3
+    assert buffered.acked == 4
+    assert inner.rows == ["row-0000", "row-0001", "row-0003"]
+
+
+def test_spill_keeps_the_order(tmp_path):
+    async def run():
+        inner = RecordingSink()
+        inner.gate.clear()
+        buffered = BufferedSink(
+            inner, BufferConfig(size=2, spill_dir=tmp_path), policy="spill"
+        )
+        await buffered.init()
+        for row in rows(20):
+            await buffered.output(row)
+        spilled = buffered.spilled
+
+        # Let part of the spilled rows be sent, and keep producing
+        inner.gate.set()
+        await asyncio.sleep(0)
+        for row in rows(20, start=20):
+            await buffered.output(row)
+            await asyncio.sleep(0)
+        await buffered.teardown()
+        return inner, buffered, spilled
+
+    inner, buffered, spilled = asyncio.run(run())
+    assert spilled == 18
+    assert inner.rows == rows(40)
+    assert buffered.acked == 40
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spill_waits_for_the_sink_when_the_file_is_full(tmp_path, capsys):
+    async def run():
+        inner = RecordingSink(delay_s=0.001)
+        # Each spilled row takes 11 bytes, so the file is full after 5 rows
+        buffer = BufferConfig(size=2, spill_dir=tmp_path, spill_max_bytes=55)
+        buffered = BufferedSink(inner, buffer, policy="spill")
+        await buffered.init()
+        max_pending = 0
+        for row in rows(50):
+            await buffered.output(row)
+            max_pending = max(max_pending, buffered.pending)
+        await buffered.teardown()
+        return inner, buffered, max_pending
+
+    inner, buffered, max_pending = asyncio.run(run())
+    assert inner.rows == rows(50)
+    # The buffer, the spill file and the row that is being sent
+    assert max_pending <= 2 + 5 + 1
+    assert buffered.spilled > 0
+    assert "spill file is full" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("policy", ["block", "drop", "spill"])
+def test_worker_error_reaches_output_and_teardown(tmp_path, policy):
+    async def run():
+        inner = RecordingSink(fail_at=3)
+        buffered = BufferedSink(
+            inner, BufferConfig(size=1, spill_dir=tmp_path), policy=policy
+        )
+        await buffered.init()
+        with pytest.raises(RuntimeError, match="failed") as output_error:
+            for row in rows(100):
+                await buffered.output(row)
+                await asyncio.sleep(0)
+        with pytest.raises(RuntimeError, match="failed") as teardown_error:
+            await buffered.teardown()
+        return output_error.value, teardown_error.value
+
+    output_error, teardown_error = asyncio.run(asyncio.wait_for(run(), timeout=5))
+    assert isinstance(output_error.__cause__, ValueError)
+    assert isinstance(teardown_error.__cause__, ValueError)
+
+
+def test_single_sink_defaults_to_block(tmp_path):
+    source_path = tmp_path / "data.csv"
+    source_path.write_text("a\n1\n")
+    conf = config.Configuration.model_validate(
+        {
+            "source": {"type": "csv", "path": str(source_path)},
+            "sink": {"type": "console"},
+            "format": {"type": "json"},
+            "conductor": {"type": "rate", "rate": 10},
+            "timestamp": {"type": "none"},
+        }
+    )
+    assert [s.policy for s in sink.build(conf)] == ["block"]
+
+    conf.sink = [conf.sink, conf.sink.model_copy()]
+    assert [s.policy for s in sink.build(conf)] == ["spill", "spill"]
+
+
+def test_slow_sink_does_not_slow_down_the_others(tmp_path, monkeypatch):
+    source_path = tmp_path / "data.csv"
+    source_path.write_text("a\n" + "".join(f"{i}\n" for i in range(100)))
+    conf = config.Configuration.model_validate(
+        {
+            "source": {"type": "csv", "path": str(source_path)},
+            "sink": [
+                {"type": "console", "buffer": {"size": 10, "policy": "block"}},
+                {
+                    "type": "console",
+                    "buffer": {
+                        "size": 10,
+                        "policy": "spill",
+                        "spill_dir": str(tmp_path),
+                    },
+                },
+            ],
+            "format": {"type": "json"},
+            "conductor": {"type": "rate", "rate": 1000},
+            "timestamp": {"type": "none"},
+        }
+    )
+    fast, slow = RecordingSink(), RecordingSink(delay_s=0.01)
+    inner_sinks = [fast, slow]
+    monkeypatch.setattr(sink, "build_sink", lambda sink_conf: inner_sinks.pop(0))
+
+    asyncio.run(main.generate_data(conf))
+
+    expected = [f'{{"a": {i}}}' for i in range(100)]
+    assert fast.rows == expected
+    assert slow.rows == expected
+    # The fast sink got every row long before the slow one had sent half of them
+    assert sum(t <= fast.times[-1] for t in slow.times) < 50
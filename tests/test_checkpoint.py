@@ -0,0 +1,144 @@
+"""Tests for the checkpoints and resuming a replay"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import time
+
+import pytest
+
+from datacat import checkpoint, conductor, config, main, sink
+from datacat.checkpoint import Checkpoint, Checkpointer
+from datacat.source import SourcePosition
+from tests.helpers import RecordingSink
+
+
+def make_conf(tmp_path, every_rows: int = 10, buffer_size: int = 1000):
+    source_path = tmp_path / "data.csv"
+    source_path.write_text("a\n" + "".join(f"{i}\n" for i in range(100)))
+    return config.Configuration.model_validate(
+        {
+            "source": {"type": "csv", "path": str(source_path)},
+            "sink": {"type": "console", "buffer": {"size": buffer_size}},
+            "format": {"type": "json"},
+            "conductor": {"type": "rate", "rate": 10_000},
+            "timestamp": {"type": "none"},
+            "checkpoint": {
+                "path": str(tmp_path / "checkpoint.json"),
+                "every_rows": every_rows,
+            },
+        }
+    )
+
+
+def expected_rows(n: int, start: int = 0) -> list[str]:
+    return [f'{{"a": {i}}}' for i in range(start, n)]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    saved = Checkpoint(
+        rows=42,
+        position=SourcePosition(row=12, offset=1024, offset_row=10, file="data.csv"),
+        anchor="2023-01-01T00:00:00",
+    )
+    saved.save(path)
+
+    assert Checkpoint.load(path) == saved
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_checkpointer_is_due_every_rows(tmp_path):
+    checkpointer = Checkpointer(tmp_path / "checkpoint.json", every_rows=10, every_s=60)
+    assert not checkpointer.due(9)
+    assert checkpointer.due(10)
+
+    checkpointer.add(Checkpoint(10, SourcePosition(row=10)))
+    assert not checkpointer.due(19)
+    assert checkpointer.due(20)
+
+
+def test_checkpointer_only_saves_acked_rows(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    checkpointer = Checkpointer(path, every_rows=10, every_s=60)
+    for rows in (10, 20, 30):
+        checkpointer.add(Checkpoint(rows, SourcePosition(row=rows)))
+
+    checkpointer.commit(9)
+    assert checkpointer.load() is None
+
+    checkpointer.commit(25)
+    assert checkpointer.load().rows == 20
+
+    # Acknowledging fewer rows never goes back, nor saves a later checkpoint
+    checkpointer.commit(15)
+    assert checkpointer.load().rows == 20
+
+    checkpointer.commit(30)
+    assert checkpointer.load().rows == 30
+
+
+def test_original_rate_conductor_resumes_from_anchor(tmp_path):
+    start = datetime.datetime(2023, 1, 1)
+    data = [
+        {"i": i, "timestamp": (start + datetime.timedelta(seconds=i / 20)).isoformat()}
+        for i in range(6)
+    ]
+    orchestrator = conductor.OriginalRateConductor("timestamp")
+
+    async def run() -> tuple[list[dict], float]:
+        first = orchestrator.conduct(iter(data[:3]))
+        head = [row async for row in first]
+        Checkpoint(3, SourcePosition(row=3), first.anchor).save(tmp_path / "c.json")
+
+        saved = Checkpoint.load(tmp_path / "c.json")
+        resumed = orchestrator.conduct(iter(data[3:]), anchor=saved.anchor)
+        before = time.monotonic()
+        tail = [await resumed.__anext__()]
+        elapsed = time.monotonic() - before
+        tail += [row async for row in resumed]
+        return head + tail, elapsed
+
+    rows, elapsed = asyncio.run(run())
+    assert rows == data
+    # The first resumed row keeps its delay from the last row of the previous run,
+    # instead of being sent straight away
+    assert 0.04 <= elapsed < 0.5
+
+
+def test_resume_after_a_limited_run(tmp_path, capsys):
+    conf = make_conf(tmp_path)
+
+    asyncio.run(main.generate_data(conf, n=35))
+    first = capsys.readouterr().out.splitlines()
+    assert checkpoint.build(conf).load().rows == 35
+
+    asyncio.run(main.generate_data(conf, n=80, resume=True))
+    second = capsys.readouterr().out.splitlines()
+
+    assert first + second == expected_rows(80)
+
+
+def test_resume_after_a_failure_is_at_least_once(tmp_path, monkeypatch):
+    conf = make_conf(tmp_path, every_rows=5, buffer_size=3)
+
+    failing = RecordingSink(fail_at=23)
+    monkeypatch.setattr(sink, "build_sink", lambda sink_conf: failing)
+    with pytest.raises(RuntimeError, match="failed"):
+        asyncio.run(main.generate_data(conf))
+
+    # The checkpoint never includes rows that the sink did not acknowledge
+    saved = checkpoint.build(conf).load()
+    assert saved is not None
+    assert saved.rows <= len(failing.rows) == 23
+
+    resumed = RecordingSink()
+    monkeypatch.setattr(sink, "build_sink", lambda sink_conf: resumed)
+    asyncio.run(main.generate_data(conf, resume=True))
+
+    assert resumed.rows == expected_rows(100, start=saved.rows)
+    # Every row is sent, and the only duplicates are the ones after the checkpoint,
+    # which can lag behind the failure by a checkpoint interval plus the buffer
+    assert set(failing.rows + resumed.rows) == set(expected_rows(100))
+    duplicates = len(failing.rows) - saved.rows
+    assert duplicates <= conf.checkpoint.every_rows + conf.sink.buffer.size
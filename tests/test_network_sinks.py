@@ -0,0 +1,270 @@
+"""Tests for the network sinks, run against in-process stand-in servers"""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from datacat.config import BatchConfig, RetryConfig
+from datacat.sink import HttpSink, TcpSink, UdpSink
+
+
+def batching(
+    max_rows: int = 500, max_bytes: int = 1024 * 1024, linger_ms: float = 10_000
+) -> dict:
+    return dict(
+        batch=BatchConfig(max_rows=max_rows, max_bytes=max_bytes, linger_ms=linger_ms),
+        retry=RetryConfig(max_attempts=3, backoff_ms=1, max_backoff_ms=10),
+        max_in_flight=2,
+    )
+
+
+class HttpStandIn:
+    """A minimal HTTP/1.1 keep-alive server that records the rows of each request.
+
+    The statuses in `fail_with` are answered (in order) before accepting requests
+    """
+
+    def __init__(self, fail_with: list[int] | None = None):
+        self.fail_with = list(fail_with or [])
+        self.requests: list[list[bytes]] = []
+        self.bodies: list[bytes] = []
+        self.headers: list[dict[str, str]] = []
+        self.failed = 0
+        self.connections = 0
+        self.server: asyncio.Server | None = None
+
+    @property
+    def url(self) -> str:
+        assert self.server is not None
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/ingest"
+
+    @property
+    def rows(self) -> list[bytes]:
+        return [row for request in self.requests for row in request]
+
+    async def __aenter__(self) -> HttpStandIn:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        while await reader.readline():
+            headers = {}
+            while (line := await reader.readline()) != b"\r\n":
+                name, _, value = line.decode().partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers["content-length"]))
+            self.headers.append(headers)
+
+            if self.fail_with:
+                status = self.fail_with.pop(0)
+                self.failed += 1
+                writer.write(
+                    f"HTTP/1.1 {status} Error\r\nContent-Length: 0\r\n\r\n".encode()
+                )
+            else:
+                self.bodies.append(body)
+                self.requests.append(body.splitlines())
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+            await writer.drain()
+        writer.close()
+
+
+def rows(n: int) -> list[str]:
+    return [f"row-{i:04}" for i in range(n)]
+
+
+async def send(sink, data: list[str]):
+    await sink.init()
+    for row in data:
+        await sink.output(row)
+    await sink.teardown()
+
+
+def test_http_sink_batches_by_count():
+    async def run():
+        async with HttpStandIn() as server:
+            sink = HttpSink(server.url, "POST", {}, 5, 2, **batching(max_rows=10))
+            await send(sink, rows(35))
+        return server
+
+    server = asyncio.run(run())
+    assert sorted(len(request) for request in server.requests) == [5, 10, 10, 10]
+    assert sorted(server.rows) == [row.encode() for row in rows(35)]
+
+
+def test_http_sink_batches_by_bytes():
+    async def run():
+        async with HttpStandIn() as server:
+            # Each row has 9 bytes with its newline, so only 3 of them fit in a batch
+            sink = HttpSink(server.url, "POST", {}, 5, 2, **batching(max_bytes=32))
+            await send(sink, rows(10))
+        return server
+
+    server = asyncio.run(run())
+    assert sorted(len(request) for request in server.requests) == [1, 3, 3, 3]
+    assert max(len(body) for body in server.bodies) <= 32
+    assert sorted(server.rows) == [row.encode() for row in rows(10)]
+
+
+def test_http_sink_batches_by_linger():
+    async def run():
+        async with HttpStandIn() as server:
+            sink = HttpSink(server.url, "POST", {}, 5, 2, **batching(linger_ms=20))
+            await sink.init()
+            for row in rows(5):
+                await sink.output(row)
+            # The batch is not full, but it is sent once it lingers long enough
+            await asyncio.sleep(0.2)
+            received = [len(request) for request in server.requests]
+            await sink.teardown()
+        return received
+
+    assert asyncio.run(run()) == [5]
+
+
+def test_http_sink_keeps_the_credentials_out_of_the_host():
+    async def run():
+        async with HttpStandIn() as server:
+            url = server.url.replace("http://", "http://user:p%40ss@")
+            sink = HttpSink(url, "POST", {}, 5, 2, **batching())
+            await send(sink, rows(1))
+            host = server.url.split("/")[2]
+        return server, host
+
+    server, host = asyncio.run(run())
+    assert server.headers[0]["host"] == host
+    # base64 of "user:p@ss"
+    assert server.headers[0]["authorization"] == "Basic dXNlcjpwQHNz"
+
+
+def test_http_sink_retries_unavailable():
+    async def run():
+        async with HttpStandIn(fail_with=[503, 503]) as server:
+            sink = HttpSink(server.url, "POST", {}, 5, 2, **batching(max_rows=10))
+            await send(sink, rows(20))
+        return server
+
+    server = asyncio.run(run())
+    assert server.failed == 2
+    assert sorted(server.rows) == [row.encode() for row in rows(20)]
+
+
+def test_http_sink_reuses_connections():
+    async def run():
+        async with HttpStandIn() as server:
+            sink = HttpSink(server.url, "POST", {}, 5, 2, **batching(max_rows=10))
+            await send(sink, rows(200))
+        return server
+
+    server = asyncio.run(run())
+    assert len(server.requests) == 20
+    assert server.connections <= 2
+
+
+def test_http_sink_fails_on_client_error():
+    async def run():
+        async with HttpStandIn(fail_with=[400]) as server:
+            sink = HttpSink(server.url, "POST", {}, 5, 2, **batching())
+            await send(sink, rows(3))
+
+    with pytest.raises(RuntimeError, match="failed"):
+        asyncio.run(run())
+
+
+def test_tcp_sink_sends_lines():
+    received: list[bytes] = []
+    connections = []
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connections.append(writer)
+        while line := await reader.readline():
+            received.append(line)
+
+    async def run():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        sink = TcpSink("127.0.0.1", port, pool_size=2, **batching(max_rows=10))
+        await send(sink, rows(100))
+        # Let the server read everything that was sent
+        await asyncio.sleep(0.1)
+        server.close()
+
+    asyncio.run(run())
+    assert sorted(received) == [f"{row}\n".encode() for row in rows(100)]
+    assert len(connections) <= 2
+
+
+def test_tcp_sink_fails_when_refused():
+    async def run():
+        server = await asyncio.start_server(lambda r, w: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+
+        sink = TcpSink("127.0.0.1", port, pool_size=1, **batching())
+        await send(sink, rows(1))
+
+    with pytest.raises(RuntimeError, match="failed"):
+        asyncio.run(run())
+
+
+def test_udp_sink_sends_datagrams():
+    received: list[bytes] = []
+
+    class StandIn(asyncio.DatagramProtocol):
+        def datagram_received(self, data: bytes, addr):
+            received.append(data)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            StandIn, local_addr=("127.0.0.1", 0)
+        )
+        port = transport.get_extra_info("sockname")[1]
+        sink = UdpSink("127.0.0.1", port, **batching(max_rows=10))
+        await send(sink, rows(50))
+        await asyncio.sleep(0.1)
+        transport.close()
+
+    asyncio.run(run())
+    assert sorted(received) == [row.encode() for row in rows(50)]
+
+
+def test_http_sink_acks_only_sent_rows():
+    async def run():
+        async with HttpStandIn() as server:
+            sink = HttpSink(server.url, "POST", {}, 5, 2, **batching(max_rows=10))
+            await sink.init()
+            for row in rows(25):
+                await sink.output(row)
+            # Let the full batches be sent, the last one is still open
+            await asyncio.sleep(0.1)
+            acked_before = sink.acked
+            await sink.teardown()
+        return acked_before, sink.acked
+
+    assert asyncio.run(run()) == (20, 25)
+
+
+def test_http_sink_does_not_ack_after_a_failed_batch():
+    async def run():
+        async with HttpStandIn(fail_with=[400]) as server:
+            sink = HttpSink(server.url, "POST", {}, 5, 1, **batching(max_rows=10))
+            await sink.init()
+            with pytest.raises(RuntimeError):
+                try:
+                    for row in rows(30):
+                        await sink.output(row)
+                        await asyncio.sleep(0)
+                finally:
+                    await sink.teardown()
+        return sink.acked
+
+    assert asyncio.run(run()) == 0
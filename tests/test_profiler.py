@@ -0,0 +1,135 @@
+"""Tests for the profiling configuration"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import cProfile
+import pstats
+from pathlib import Path
+
+import pytest
+
+from datacat import config, main, profiler
+
+
+def make_conf(tmp_path, profile: dict | None = None) -> config.Configuration:
+    source_path = tmp_path / "data.csv"
+    source_path.write_text("a,b\n1,x\n")
+    return config.Configuration.model_validate(
+        {
+            "source": {"type": "csv", "path": str(source_path)},
+            "sink": {"type": "console"},
+            "format": {"type": "json"},
+            "conductor": {"type": "rate", "rate": 10},
+            "timestamp": {"type": "none"},
+            "profile": profile,
+        }
+    )
+
+
+def cli_args(**kwargs) -> argparse.Namespace:
+    defaults = dict(
+        path=None, checkpoint=None, resume=False, profile=False, profile_path=None
+    )
+    return argparse.Namespace(**{**defaults, **kwargs})
+
+
+def test_cli_profile_flag_uses_default_path():
+    data = config.prepare_cli_args(cli_args(profile=True))
+    assert data["profile"] == {}
+
+
+def test_cli_profile_path_enables_profiling(tmp_path):
+    data = config.prepare_cli_args(cli_args(profile_path=tmp_path / "run.prof"))
+    assert data["profile"] == {"path": str(tmp_path / "run.prof")}
+
+
+def test_profiler_is_not_built_without_profile(tmp_path):
+    assert profiler.build(make_conf(tmp_path)) is None
+
+
+def test_profiler_refuses_to_overwrite_the_source(tmp_path):
+    conf = make_conf(tmp_path, {"path": str(tmp_path / "data.csv"), "cprofile": True})
+    with pytest.raises(RuntimeError, match="source"):
+        profiler.build(conf)
+
+
+def test_profiler_refuses_to_overwrite_other_files(tmp_path):
+    (tmp_path / "notes").write_text("important")
+    conf = make_conf(tmp_path, {"path": str(tmp_path / "notes"), "cprofile": True})
+    with pytest.raises(RuntimeError, match="not a profile"):
+        profiler.build(conf)
+
+
+def test_profiler_refuses_to_overwrite_other_reports(tmp_path):
+    (tmp_path / "run.prof.txt").write_text("important")
+    conf = make_conf(tmp_path, {"path": str(tmp_path / "run.prof")})
+    with pytest.raises(RuntimeError, match="not a profile"):
+        profiler.build(conf)
+
+
+def test_profiler_overwrites_previous_results(tmp_path):
+    path = tmp_path / "run.prof"
+    cProfile.Profile().dump_stats(path)
+    (tmp_path / "run.prof.txt").write_text(f"{profiler.REPORT_HEADER}1.000s\n")
+
+    conf = make_conf(tmp_path, {"path": str(path), "cprofile": True})
+    assert profiler.build(conf) is not None
+
+
+def test_profiler_tells_the_results_apart_by_role(tmp_path):
+    # The stats themselves have a `.txt` suffix, like the reports
+    path = tmp_path / "run.txt"
+    cProfile.Profile().dump_stats(path)
+    (tmp_path / "run.txt.txt").write_text(f"{profiler.REPORT_HEADER}1.000s\n")
+
+    conf = make_conf(tmp_path, {"path": str(path), "cprofile": True})
+    assert profiler.build(conf) is not None
+
+    # A report is not valid stats
+    path.write_text(f"{profiler.REPORT_HEADER}1.000s\n")
+    with pytest.raises(RuntimeError, match="not a profile"):
+        profiler.build(conf)
+
+
+def run_profiled(tmp_path, profile: dict) -> Path:
+    conf = make_conf(tmp_path, {"path": str(tmp_path / "run.prof"), **profile})
+    conf.source.path.write_text("a,b\n" + "".join(f"{i},x{i}\n" for i in range(50)))
+    conf.sink = [
+        config.ConsoleSinkConfig(type="console"),
+        config.ConsoleSinkConfig(type="console"),
+    ]
+    conf.conductor.rate = 1000
+
+    asyncio.run(main.generate_data(conf))
+    return tmp_path / "run.prof"
+
+
+def test_profiler_reports_every_stage(tmp_path, capsys):
+    path = run_profiled(tmp_path, {"cprofile": True})
+
+    stats = pstats.Stats(str(path))
+    assert stats.total_calls > 0
+
+    report = (tmp_path / "run.prof.txt").read_text()
+    assert report.startswith(profiler.REPORT_HEADER)
+    stages = report.split("== Stages ==")[1].split("==")[0]
+    names = [line.split()[0] for line in stages.splitlines() if line]
+    assert {"source", "conductor", "serialize[0]"} <= set(names)
+    for i in range(2):
+        assert f"sink[{i}] ConsoleSink (buffer)" in report
+        assert f"sink[{i}] ConsoleSink (send)" in report
+    assert "== Event loop stalls ==" in report
+    assert "cProfile ran for" in report
+    assert "== Top 20 functions (cumulative) ==" in report
+
+
+def test_profiler_only_runs_the_timers_by_default(tmp_path, capsys):
+    path = run_profiled(tmp_path, {})
+
+    assert not path.exists()
+    report = (tmp_path / "run.prof.txt").read_text()
+    assert "== Stages ==" in report
+    assert "== Event loop stalls ==" in report
+    assert "ran for" not in report
+    assert "functions (cumulative)" not in report
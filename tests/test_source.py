@@ -0,0 +1,115 @@
+"""Tests for the sources and resuming them from a position"""
+from __future__ import annotations
+
+import json
+
+import pyarrow
+import pyarrow.csv
+import pyarrow.parquet
+import pytest
+
+from datacat import source
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # Make the files span many blocks / index entries without being big
+    monkeypatch.setattr(source, "CSV_BLOCK_SIZE", 64)
+    monkeypatch.setattr(source, "NDJSON_INDEX_INTERVAL", 7)
+
+
+def write_csv(path, rows: list[tuple]):
+    path.write_text("a,b\n" + "".join(f"{a},{b}\n" for a, b in rows))
+
+
+def test_csv_source_infers_types_from_the_whole_file(tmp_path):
+    path = tmp_path / "data.csv"
+    # `b` is empty (null) in the first blocks and only has values at the end
+    write_csv(path, [(i, "" if i < 50 else "foo") for i in range(100)])
+
+    rows = source.CsvSource(path).load()
+
+    assert rows == pyarrow.csv.read_csv(path).to_pylist()
+    assert rows[-1] == {"a": 99, "b": "foo"}
+
+
+def test_csv_source_types_do_not_depend_on_the_first_block(tmp_path):
+    path = tmp_path / "data.csv"
+    write_csv(path, [(i, 1 if i < 50 else "foo") for i in range(100)])
+
+    assert source.CsvSource(path).load() == pyarrow.csv.read_csv(path).to_pylist()
+
+
+@pytest.mark.parametrize("block_size", [1, 4, 64])
+def test_csv_source_supports_newlines_in_quoted_fields(tmp_path, monkeypatch, block_size):
+    monkeypatch.setattr(source, "CSV_BLOCK_SIZE", block_size)
+    path = tmp_path / "data.csv"
+    path.write_bytes(b'a,b\n1,"x\ny"\n2,z\n3,"""q""\n,\n"\n4,"\n"\n')
+
+    rows = source.CsvSource(path).load()
+
+    assert rows == pyarrow.csv.read_csv(path).to_pylist()
+    assert rows[2] == {"a": 3, "b": '"q"\n,\n'}
+
+
+def test_csv_source_does_not_infer_the_types_when_resuming(tmp_path, monkeypatch):
+    path = tmp_path / "data.csv"
+    write_csv(path, [(i, 1 if i < 50 else "foo") for i in range(100)])
+
+    first = source.CsvSource(path)
+    head = [row for _, row in zip(range(70), first.stream())]
+    position = first.position
+
+    def infer_schema(self):
+        raise AssertionError("the types should come from the position")
+
+    monkeypatch.setattr(source.CsvSource, "_infer_schema", infer_schema)
+    tail = list(source.CsvSource(path).stream(position))
+
+    assert head + tail == pyarrow.csv.read_csv(path).to_pylist()
+
+
+def make_sources(tmp_path) -> dict[str, source.Source]:
+    rows = [{"a": i, "b": f"x{i}"} for i in range(100)]
+
+    write_csv(tmp_path / "data.csv", [(row["a"], row["b"]) for row in rows])
+    pyarrow.parquet.write_table(
+        pyarrow.Table.from_pylist(rows), tmp_path / "data.parquet", row_group_size=13
+    )
+    (tmp_path / "data.json").write_text(json.dumps(rows))
+    (tmp_path / "glob").mkdir(exist_ok=True)
+    for i, part in enumerate([rows[:40], rows[40:]]):
+        lines = "".join(json.dumps(row) + "\n" for row in part)
+        (tmp_path / "glob" / f"part-{i}.ndjson").write_text(lines)
+
+    return {
+        "csv": source.CsvSource(tmp_path / "data.csv"),
+        "parquet": source.ParquetSource(tmp_path / "data.parquet"),
+        "ndjson": source.NdJsonSource(tmp_path / "glob" / "part-1.ndjson"),
+        "json": source.JsonSource(tmp_path / "data.json"),
+        "glob": source.GlobFileSource(
+            str(tmp_path / "glob" / "*.ndjson"), source.NdJsonSource
+        ),
+    }
+
+
+@pytest.mark.parametrize("kind", ["csv", "parquet", "ndjson", "json", "glob"])
+@pytest.mark.parametrize("stop", [0, 1, 6, 7, 13, 40, 41, 59, 60, 100])
+def test_source_resumes_from_position(tmp_path, kind, stop):
+    expected = make_sources(tmp_path)[kind].load()
+
+    first = make_sources(tmp_path)[kind]
+    stream = iter(first.stream())
+    head = [row for _, row in zip(range(stop), stream)]
+    position = first.position
+
+    tail = list(make_sources(tmp_path)[kind].stream(position))
+    assert head + tail == expected
+
+
+def test_source_rejects_position_of_another_file(tmp_path):
+    sources = make_sources(tmp_path)
+    position = source.SourcePosition(row=3, file=str(tmp_path / "other.csv"))
+
+    with pytest.raises(RuntimeError):
+        sources["csv"].stream(position)